@@ -1,9 +1,11 @@
-import pygame, copy
+import pygame, copy, weakref
 
 from drawing import Drawing
 from simulator import Simulation
-
-pygame.init()
+from trajectory_cache import TrajectoryCache, CachedSimulation
+from scene import save_scene
+from snapping import SnapIndex, snap_to_grid
+from rendering import load_image, PIVOT_IMAGE_PATH
 
 class Toolbar:
     TOOL_BAR_BACKGROUND_COLOR = (180, 180, 180)
@@ -18,17 +20,17 @@ class Toolbar:
             {
                 "type": "tool",
                 "tool_id": "line",
-                "icon": pygame.image.load("assets/toolbar/line.png").convert_alpha(),
+                "icon": load_image("assets/toolbar/line.png"),
             },
             {
                 "type": "tool",
                 "tool_id": "pivot",
-                "icon": pygame.image.load("assets/toolbar/pivot.png").convert_alpha(),
+                "icon": load_image("assets/toolbar/pivot.png"),
             },
             {
                 "type": "tool",
                 "tool_id": "anchor",
-                "icon": pygame.image.load("assets/toolbar/anchor.png").convert_alpha(),
+                "icon": load_image("assets/toolbar/anchor.png"),
             },
         ]
 
@@ -61,8 +63,116 @@ class Toolbar:
             x += 55
 
 
+class DrawingManager:
+    """
+    Scrollable sidebar listing the drawings.
+
+    Only the rows inside the visible window are ever painted, rendered names are cached per
+    drawing, and a state change only repaints the rows it touches.
+    """
+    BACKGROUND_COLOUR = (200, 200, 200, 220)
+    ACTIVE_ROW_COLOUR = (180, 180, 250)
+
+    WIDTH = 250
+    ROW_HEIGHT = 40
+    PADDING = 10
+
+    def __init__(self, drawings, font, visible_icon, not_visible_icon, position, max_height):
+        self.drawings = drawings  # shared with App, never reassigned
+        self.font = font
+        self.visible_icon = visible_icon
+        self.not_visible_icon = not_visible_icon
+
+        self.x, self.y = position
+        self.max_height = max_height
+        self.scroll_offset = 0
+        self.surface = None
+
+        self.__name_cache = weakref.WeakKeyDictionary()  # drawing -> (name, rendered text)
+
+    def __content_height(self):
+        return self.PADDING * 2 + len(self.drawings) * self.ROW_HEIGHT
+
+    def __max_scroll(self):
+        return max(0, self.__content_height() - self.surface.get_height())
+
+    def __name_text(self, drawing):
+        cached = self.__name_cache.get(drawing)
+        if cached is None or cached[0] != drawing.name:
+            cached = self.__name_cache[drawing] = (drawing.name, self.font.render(drawing.name, True, (0, 0, 0)))
+        return cached[1]
+
+    def __paint_row(self, index, active_drawing):
+        top = self.PADDING + index * self.ROW_HEIGHT - self.scroll_offset
+        if top + self.ROW_HEIGHT <= 0 or top - 2 >= self.surface.get_height():
+            return  # scrolled out of view
+
+        self.surface.set_clip((0, top - 2, self.WIDTH, self.ROW_HEIGHT))
+        self.surface.fill(self.BACKGROUND_COLOUR)
+
+        if index < len(self.drawings):
+            drawing = self.drawings[index]
+
+            # highlight active drawing
+            if index == active_drawing:
+                pygame.draw.rect(self.surface, self.ACTIVE_ROW_COLOUR, (5, top - 2, self.WIDTH - 10, 36), border_radius=5)
+
+            # name text
+            self.surface.blit(self.__name_text(drawing), (40, top + 8))
+
+            # visibility toggle
+            icon = self.visible_icon if drawing.visible else self.not_visible_icon
+            self.surface.blit(icon, (10, top + 4))
+
+        self.surface.set_clip(None)
+
+    def redraw(self, active_drawing):
+        """Full repaint of the visible rows, needed when drawings are added / removed or on scroll."""
+        height = min(self.__content_height(), self.max_height)
+        if self.surface is None or self.surface.get_height() != height:
+            self.surface = pygame.Surface((self.WIDTH, height), pygame.SRCALPHA)
+
+        self.scroll_offset = min(self.scroll_offset, self.__max_scroll())
+        self.surface.fill(self.BACKGROUND_COLOUR)
+
+        first = max(0, (self.scroll_offset - self.PADDING) // self.ROW_HEIGHT)
+        last = (self.scroll_offset + height) // self.ROW_HEIGHT + 1
+        for index in range(first, min(last, len(self.drawings))):
+            self.__paint_row(index, active_drawing)
+
+    def repaint_rows(self, active_drawing, *indices):
+        for index in indices:
+            if 0 <= index < len(self.drawings):
+                self.__paint_row(index, active_drawing)
+
+    def scroll(self, dy, active_drawing):
+        offset = min(max(0, self.scroll_offset + dy), self.__max_scroll())
+        if offset != self.scroll_offset:
+            self.scroll_offset = offset
+            self.redraw(active_drawing)
+
+    def contains(self, x, y):
+        return (self.x <= x <= self.x + self.surface.get_width() and
+                self.y <= y <= self.y + self.surface.get_height())
+
+    def row_at(self, x, y):
+        """Index of the drawing under a screen position, or None."""
+        if not self.contains(x, y):
+            return None
+
+        index = (y - self.y - self.PADDING + self.scroll_offset) // self.ROW_HEIGHT
+        if 0 <= index < len(self.drawings):
+            return int(index)
+        return None
+
+    def is_visibility_toggle(self, x):
+        return 10 <= (x - self.x) <= 30
+
+
 class App:
     GRID_SPACING = 50
+    PIVOT_GRID_SPACING = GRID_SPACING // 2  # pivots snap to the half-grid
+    SNAP_RADIUS = 10  # screen pixels, for snapping onto existing endpoints / pivots
     ZOOM_MULTIPLIER = 0.1
 
     BACKGROUND_COLOR = (220, 220, 220)
@@ -71,7 +181,16 @@ class App:
 
     HINT_TEXT_COLOUR = (10, 10, 10)
 
+    SCENE_PATH = "scene.json"
+    DEBUG = False  # Shows per-tick allocation stats (tracemalloc) while simulating
+    DETERMINISTIC_SIMULATION = True  # Fixed-step simulation, so repeated runs of a scene match exactly
+    MAX_TICKS_PER_FRAME = 5  # Fixed-step catch up limit, so a slow frame can't snowball
+    SIMULATION_CACHE_DIR = ".sim_cache"  # Recorded deterministic trajectories, replayed on re-runs
+
     def __init__(self):
+        # Only the interactive front end needs SDL, so it is initialised here rather than on import
+        pygame.init()
+
         # View + interaction state
         self.zoom = 1.0
         self.dragging = False
@@ -92,10 +211,13 @@ class App:
         self.drawings = [Drawing("Drawing 1")]
         self.active_drawing = 0
 
+        # Every line endpoint + pivot across all drawings, for snapping
+        self.snap_index = SnapIndex()
+
         # Icons
-        self.VISIBLE_IMAGE = pygame.image.load("assets/drawing_manager/visible.png").convert_alpha()
-        self.NOT_VISIBLE_IMAGE = pygame.image.load("assets/drawing_manager/not_visible.png").convert_alpha()
-        self.PIVOT_IMAGE = pygame.image.load("assets/placables/pivot.png").convert_alpha()
+        self.VISIBLE_IMAGE = load_image("assets/drawing_manager/visible.png")
+        self.NOT_VISIBLE_IMAGE = load_image("assets/drawing_manager/not_visible.png")
+        self.PIVOT_IMAGE = load_image(PIVOT_IMAGE_PATH)
 
         # UI
         self.font = pygame.font.SysFont("monospace", 16)
@@ -107,7 +229,11 @@ class App:
         self.background_update_required = False
 
         # Drawing manager UI cache
-        self.__drawing_manager_surface = self.__create_drawing_manager()
+        self.__drawing_manager = DrawingManager(
+            self.drawings, self.font, self.VISIBLE_IMAGE, self.NOT_VISIBLE_IMAGE,
+            position=(10, 10), max_height=win_size[1] - 80
+        )
+        self.__drawing_manager.redraw(self.active_drawing)
         self.drawing_manager_update_required = False
 
         # Undo
@@ -130,14 +256,15 @@ class App:
             if event_type == "line.draw":
                 drawing_index, target_index = event_data
 
-                self.drawings[drawing_index].lines.pop(target_index)
-                self.drawings[drawing_index].lines.insert(target_index, None)
+                self.snap_index.remove_line(self.drawings[drawing_index].lines[target_index])
+                self.drawings[drawing_index].remove_line(target_index)
 
             elif event_type == "pivot.draw":
                 drawing_index, target_index = event_data
 
-                self.drawings[drawing_index].pivots.pop(target_index)
-                self.drawings[drawing_index].pivots.insert(target_index, None)
+                px, py, _ = self.drawings[drawing_index].pivots[target_index]
+                self.snap_index.remove_point(px, py)
+                self.drawings[drawing_index].remove_pivot(target_index)
 
             elif event_type == "pivot.link":
                 drawing_index, target_index = event_data
@@ -147,7 +274,7 @@ class App:
                 self.connecting_pivot = True
 
             elif event_type == "drawing.new":
-                self.drawings.pop(event_data)
+                self.snap_index.remove_drawing(self.drawings.pop(event_data))
                 self.drawing_manager_update_required = True
 
                 if self.active_drawing >= len(self.drawings):
@@ -157,50 +284,33 @@ class App:
                 raise NotImplementedError(f"Failed to undo value. Not implemented: {event_type}: {event_data}")
 
 
-    def __create_drawing_manager(self):
-        """Builds the drawing manager sidebar surface."""
-        width = 250
-        height = 20 + len(self.drawings) * 40
-        surface = pygame.Surface((width, height), pygame.SRCALPHA)
-        surface.fill((200, 200, 200, 220))
+    def snap(self, screen_x, screen_y, grid_spacing):
+        """Screen position → drawing space, snapped onto a nearby endpoint / pivot, else the grid (if locked)."""
+        x = (screen_x - self.view_position[0]) / self.zoom
+        y = (screen_y - self.view_position[1]) / self.zoom
 
-        y = 10
-        for i, drawing in enumerate(self.drawings):
-            # highlight active drawing
-            if i == self.active_drawing:
-                pygame.draw.rect(surface, (180, 180, 250), (5, y - 2, width - 10, 36), border_radius=5)
-
-            # name text
-            text = self.font.render(drawing.name, True, (0, 0, 0))
-            surface.blit(text, (40, y + 8))
+        feature = self.snap_index.nearest(x, y, self.SNAP_RADIUS / self.zoom)
+        if feature is not None:
+            return feature
 
-            # visibility toggle
-            icon = self.VISIBLE_IMAGE if drawing.visible else self.NOT_VISIBLE_IMAGE
-            surface.blit(icon, (10, y + 4))
+        if self.grid_lock:
+            return snap_to_grid(x, y, grid_spacing)
 
-            y += 40
-
-        return surface.convert_alpha()
+        return x, y
 
     def handle_drawing_manager_click(self, x, y):
         """Handle clicks inside the drawing manager."""
-        if not self.__drawing_manager_surface:
+        if not self.__drawing_manager.contains(x, y):
             return False
 
-        # Check if click is inside the sidebar
-        dm_x, dm_y = 10, 10  # top-left corner of manager on screen
-        if not (dm_x <= x <= dm_x + self.__drawing_manager_surface.get_width() and
-                dm_y <= y <= dm_y + self.__drawing_manager_surface.get_height()):
-            return False
-
-        rel_y = y - dm_y - 10
-        index = rel_y // 40
-        if 0 <= index < len(self.drawings):
-            if 10 <= (x - dm_x) <= 30:  # clicked visibility icon
+        index = self.__drawing_manager.row_at(x, y)
+        if index is not None:
+            if self.__drawing_manager.is_visibility_toggle(x):  # clicked visibility icon
                 self.drawings[index].visible = not self.drawings[index].visible
+                self.__drawing_manager.repaint_rows(self.active_drawing, index)
             else:  # clicked row → set active
-                self.active_drawing = index
-            self.drawing_manager_update_required = True
+                previous, self.active_drawing = self.active_drawing, index
+                self.__drawing_manager.repaint_rows(self.active_drawing, previous, index)
             return True
 
         return False
@@ -227,21 +337,23 @@ class App:
         return surface.convert_alpha()
 
     def run_simulation(self):
-        pivot_image = self.drawings[0].pivot_image
-
-        for drawing in self.drawings:
-            drawing.pivot_image = None
-
         drawings = copy.deepcopy(self.drawings)
 
-        for drawing in self.drawings:
-            drawing.pivot_image = pivot_image
-
         SPEED_MULTIPLIER = 1
 
-        sim = Simulation(drawings, gravity=True)
+        if self.DETERMINISTIC_SIMULATION:
+            # Replays the last run of an unchanged scene, only stepping live past what was recorded
+            cache = TrajectoryCache(self.SIMULATION_CACHE_DIR)
+            cache_key = cache.key(drawings, gravity=True)
+            sim = CachedSimulation(
+                drawings, cache.get(cache_key), gravity=True, debug=self.DEBUG,
+                max_recorded_ticks=cache.max_ticks(len(drawings)),
+            )
+        else:
+            sim = Simulation(drawings, gravity=True, debug=self.DEBUG)
         clock = pygame.time.Clock()
         target_fps = 60
+        unsimulated_time = 0.0
 
         sim_running = True
         while sim_running:
@@ -253,16 +365,36 @@ class App:
 
             self.screen.fill((*self.BACKGROUND_COLOR, 255))
 
-            sim.tick(delta_time * SPEED_MULTIPLIER)
+            if sim.deterministic:
+                # Step in whole fixed ticks, carrying the remainder over to the next frame
+                unsimulated_time += delta_time * SPEED_MULTIPLIER
+                ticks = min(int(unsimulated_time / sim.FIXED_DELTA_TIME), self.MAX_TICKS_PER_FRAME)
+                unsimulated_time = min(unsimulated_time - ticks * sim.FIXED_DELTA_TIME, sim.FIXED_DELTA_TIME)
+                for _ in range(ticks):
+                    sim.tick(sim.FIXED_DELTA_TIME)
+            else:
+                sim.tick(delta_time * SPEED_MULTIPLIER)
             sim.render(self.screen, self.zoom, self.view_position)
 
             text_rect = self.font.render(f"FPS: {int(clock.get_fps())}, Sim FPS: {int(clock.get_fps() * SPEED_MULTIPLIER)}", True, (255, 0, 0))
             self.screen.blit(text_rect, (10, 10))
 
+            if self.DEBUG:
+                stats = sim.allocation_stats
+                text_rect = self.font.render(f"Tick alloc: {stats['net_bytes']}B net, {stats['peak_bytes']}B peak", True, (255, 0, 0))
+                self.screen.blit(text_rect, (10, 30))
+
+                if sim.deterministic:
+                    text_rect = self.font.render(f"Tick {sim.current_tick}: {sim.state_hash[:16]}", True, (255, 0, 0))
+                    self.screen.blit(text_rect, (10, 50))
+
             pygame.display.flip()
 
             clock.tick(target_fps)
 
+        if self.DETERMINISTIC_SIMULATION and sim.extended:
+            cache.put(cache_key, sim.finish())
+
 
     def run(self):
         self.running = True
@@ -298,50 +430,22 @@ class App:
                             continue
 
                         elif self.__toolbar.tool_id == "line" and not self.drawing_line:
-                            self.line_start_coord = (
-                                (x - self.view_position[0]) / self.zoom,
-                                (y - self.view_position[1]) / self.zoom
-                            )
-                            if self.grid_lock:
-                                self.line_start_coord = (
-                                    round((x - self.view_position[0]) / self.zoom / spacing) * spacing,
-                                    round((y - self.view_position[1]) / self.zoom / spacing) * spacing
-                                )
-
+                            self.line_start_coord = self.snap(x, y, self.GRID_SPACING)
                             self.drawing_line = True
 
                         elif self.__toolbar.tool_id == "pivot" and not self.connecting_pivot:
-                            # convert to drawing coords
-                            px = (mx - self.view_position[0]) / self.zoom
-                            py = (my - self.view_position[1]) / self.zoom
-
-                            if self.grid_lock:
-                                grid_size = self.GRID_SPACING // 2  # snap to half-grid
-                                px = round(px / grid_size) * grid_size
-                                py = round(py / grid_size) * grid_size
-
                             # store pivot as drawing-space coords
-                            self.drawings[self.active_drawing].pivots.append([px, py, None])
+                            px, py = self.snap(mx, my, self.PIVOT_GRID_SPACING)
+                            pivot_index = self.drawings[self.active_drawing].add_pivot(px, py)
+                            self.snap_index.add_point(px, py)
                             self.display_text = "Pivot: Select (Left click) a second drawing to link pivot."
                             self.connecting_pivot = True
 
-                            self.__log_ctrl_z("pivot.draw",
-                                              (self.active_drawing, len(self.drawings[self.active_drawing].pivots) - 1))
+                            self.__log_ctrl_z("pivot.draw", (self.active_drawing, pivot_index))
 
                         elif self.__toolbar.tool_id == "pivot" and self.connecting_pivot:
-                            # Check if click is inside the sidebar
-                            hovered_drawing = -1
-                            dm_x, dm_y = 10, 10  # top-left corner of manager on screen
-                            if not (dm_x <= mx <= dm_x + self.__drawing_manager_surface.get_width() and
-                                    dm_y <= my <= dm_y + self.__drawing_manager_surface.get_height()):
-                                hovered_drawing = -2
-
-                            rel_y = my - dm_y - 10
-                            possible_index = rel_y // 40
-                            if 0 <= possible_index < len(self.drawings) and hovered_drawing == -1:
-                                hovered_drawing = possible_index
-
-                            if hovered_drawing >= 0:
+                            hovered_drawing = self.__drawing_manager.row_at(mx, my)
+                            if hovered_drawing is not None:
                                 self.drawings[self.active_drawing].pivots[-1][2] = hovered_drawing
                                 self.display_text = ""
                                 self.connecting_pivot = False
@@ -355,20 +459,11 @@ class App:
                         self.dragging = False
 
                     elif event.button == 1 and self.drawing_line:
-                        line_end = (
-                            (mx - self.view_position[0]) / self.zoom,
-                            (my - self.view_position[1]) / self.zoom
-                        )
-                        if self.grid_lock:
-                            line_end = (
-                                round((mx - self.view_position[0]) / self.zoom / spacing) * spacing,
-                                round((my - self.view_position[1]) / self.zoom / spacing) * spacing
-                            )
-
-                        self.drawings[self.active_drawing].lines.append(
-                            (self.line_start_coord, line_end)
-                        )
-                        self.__log_ctrl_z("line.draw", (self.active_drawing, len(self.drawings[self.active_drawing].lines) - 1))
+                        line_end = self.snap(mx, my, self.GRID_SPACING)
+
+                        line_index = self.drawings[self.active_drawing].add_line(self.line_start_coord, line_end)
+                        self.snap_index.add_line((self.line_start_coord, line_end))
+                        self.__log_ctrl_z("line.draw", (self.active_drawing, line_index))
                         self.drawing_line = False
 
 
@@ -378,6 +473,9 @@ class App:
                     self.view_position[0] += dx
                     self.view_position[1] += dy
 
+                elif event.type == pygame.MOUSEWHEEL and self.__drawing_manager.contains(mx, my):
+                    self.__drawing_manager.scroll(-event.y * DrawingManager.ROW_HEIGHT, self.active_drawing)
+
                 elif event.type == pygame.MOUSEWHEEL:
                     self.zoom += event.y * self.ZOOM_MULTIPLIER
                     if self.zoom < 0.2:
@@ -401,6 +499,10 @@ class App:
                     if event.key == pygame.K_r and mods & pygame.KMOD_CTRL:
                         self.run_simulation()
 
+                    if event.key == pygame.K_s and mods & pygame.KMOD_CTRL:
+                        save_scene(self.SCENE_PATH, self.drawings)
+                        self.display_text = f"Saved: {self.SCENE_PATH}"
+
                     if event.key == pygame.K_n and mods & pygame.KMOD_CTRL:
                         self.drawings.append(Drawing(f"Drawing {len(self.drawings) + 1}"))
                         self.drawing_manager_update_required = True
@@ -413,7 +515,7 @@ class App:
 
             if self.drawing_manager_update_required:
                 self.drawing_manager_update_required = False
-                self.__drawing_manager_surface = self.__create_drawing_manager()
+                self.__drawing_manager.redraw(self.active_drawing)
 
             # draw background (with view offset)
             self.screen.blit(
@@ -422,17 +524,7 @@ class App:
                  self.view_position[1] % spacing - spacing)
             )
 
-            # Check if click is inside the sidebar
-            hovered_drawing = -1
-            dm_x, dm_y = 10, 10  # top-left corner of manager on screen
-            if not (dm_x <= mx <= dm_x + self.__drawing_manager_surface.get_width() and
-                    dm_y <= my <= dm_y + self.__drawing_manager_surface.get_height()):
-                hovered_drawing = -2
-
-            rel_y = my - dm_y - 10
-            possible_index = rel_y // 40
-            if 0 <= possible_index < len(self.drawings) and hovered_drawing == -1:
-                hovered_drawing = possible_index
+            hovered_drawing = self.__drawing_manager.row_at(mx, my)
 
             # draw drawings
             for i, drawing in enumerate(self.drawings):
@@ -448,13 +540,7 @@ class App:
                 )
 
                 # Convert mouse → drawing space
-                end_dx = (mx - self.view_position[0]) / self.zoom
-                end_dy = (my - self.view_position[1]) / self.zoom
-
-                if self.grid_lock:
-                    grid_size = self.GRID_SPACING
-                    end_dx = round(end_dx / grid_size) * grid_size
-                    end_dy = round(end_dy / grid_size) * grid_size
+                end_dx, end_dy = self.snap(mx, my, self.GRID_SPACING)
 
                 # back to screen space
                 end = (
@@ -470,13 +556,7 @@ class App:
                 )
 
             if self.__toolbar.tool_id == "pivot":  # Preview pivot location
-                px = (mx - self.view_position[0]) / self.zoom
-                py = (my - self.view_position[1]) / self.zoom
-
-                if self.grid_lock:
-                    grid_size = self.GRID_SPACING
-                    px = round(px / (grid_size // 2)) * (grid_size // 2)
-                    py = round(py / (grid_size // 2)) * (grid_size // 2)
+                px, py = self.snap(mx, my, self.PIVOT_GRID_SPACING)
 
                 # back to screen space
                 screen_x = px * self.zoom + self.view_position[0]
@@ -496,7 +576,7 @@ class App:
 
             # draw UI
             self.screen.blit(self.__toolbar.surface, (self.screen.get_width() * 0.1, self.screen.get_height() - 60))
-            self.screen.blit(self.__drawing_manager_surface, (10, 10))
+            self.screen.blit(self.__drawing_manager.surface, (self.__drawing_manager.x, self.__drawing_manager.y))
 
             pygame.display.flip()
 
@@ -0,0 +1,65 @@
+"""
+Measures the import cost of the headless core, so it can be tracked over time.
+
+    python bench_startup.py [--max-ms 50] >> bench_output.txt
+
+Each module is imported in a fresh interpreter with `-X importtime`. One JSON line is
+printed per module; exit code is 1 if any of them pulls in pygame or goes over --max-ms.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+CORE_MODULES = ["geometry", "drawing", "simulator", "scene", "snapping", "trajectory_cache", "cli"]
+
+
+def measure(module):
+    code = f"import sys, {module}; print('pygame' in sys.modules)"
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    # stderr lines look like: "import time:   self [us] | cumulative | imported package"
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if parts[-1].strip() == module:
+            cumulative_us = int(parts[1])
+
+    return {
+        "module": module,
+        "import_ms": cumulative_us / 1000,
+        "interpreter_ms": wall_ms,
+        "imports_pygame": proc.stdout.strip() == "True",
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import cost of the headless modules.")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if any module takes longer to import")
+    args = parser.parse_args(argv)
+
+    ok = True
+    for module in CORE_MODULES:
+        result = measure(module)
+        result["time"] = time.time()
+        print(json.dumps(result))
+
+        if result["imports_pygame"]:
+            ok = False
+        if args.max_ms is not None and result["import_ms"] > args.max_ms:
+            ok = False
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Headless batch tool for checking saved scenes, no window / display needed.
+
+    python cli.py scenes/ other_scene.json --ticks 600 --jobs 8
+
+Regression check, comparing deterministic state hashes against an earlier run:
+
+    python cli.py scenes/ --ticks 600 --deterministic > baseline.jsonl
+    python cli.py scenes/ --ticks 600 --deterministic --baseline baseline.jsonl
+
+Every scene is reported as one JSON line on stdout (in completion order, not argument order).
+Exit code is 1 if any scene failed to load, has an open drawing, or failed to simulate.
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import sys
+
+from scene import load_scene, scene_hash
+from geometry import is_closed_polygon, polygon_area, polygon_centroid, polygon_mass
+from simulator import Simulation, SimulationException
+from trajectory_cache import TrajectoryCache, CachedSimulation
+
+
+_caches = {}  # cache_dir -> TrajectoryCache, one per worker process so its running size is kept
+
+
+def open_cache(cache_dir):
+    cache = _caches.get(cache_dir)
+    if cache is None:
+        cache = _caches[cache_dir] = TrajectoryCache(cache_dir)
+    return cache
+
+
+def analyse_drawing(drawing):
+    lines = [line for line in drawing.lines if line]
+    closed = bool(lines) and is_closed_polygon(lines)[0]
+
+    report = {
+        "name": drawing.name,
+        "anchored": drawing.anchored,
+        "lines": len(lines),
+        "closed": closed,
+    }
+
+    if closed:
+        report["area"] = polygon_area(lines)
+        report["mass"] = polygon_mass(lines, Simulation.MASS_PER_AREA)
+        report["center_of_mass"] = polygon_centroid(lines)
+
+    return report
+
+
+def analyse_scene(path, **options):
+    """Never raises, anything going wrong is reported on the scene's own line so the batch carries on."""
+    result = {"path": path, "ok": False}
+
+    try:
+        return _analyse_scene(result, path, **options)
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+
+def _analyse_scene(result, path, ticks=0, delta_time=1 / 60, debug=False, deterministic=False, cache_dir=None):
+    try:
+        drawings = load_scene(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        result["error"] = f"load: {e}"
+        return result
+
+    result["drawings"] = [analyse_drawing(drawing) for drawing in drawings]
+    result["ok"] = all(report["closed"] for report in result["drawings"])
+
+    if ticks > 0 and result["ok"]:
+        if deterministic:
+            delta_time = Simulation.FIXED_DELTA_TIME
+            result["scene_hash"] = scene_hash(drawings, ticks=ticks, dt=delta_time, gravity=True)
+
+        try:
+            if deterministic and cache_dir:
+                cache = open_cache(cache_dir)
+                cache_key = cache.key(drawings, gravity=True)
+                sim = CachedSimulation(
+                    drawings, cache.get(cache_key), gravity=True, debug=debug,
+                    max_recorded_ticks=cache.max_ticks(len(drawings)),
+                )
+                result["cached_ticks"] = min(sim.cached_ticks, ticks)
+            else:
+                sim = Simulation(drawings, gravity=True, debug=debug, deterministic=deterministic)
+
+            for _ in range(ticks):
+                sim.tick(delta_time)
+
+            if deterministic and cache_dir and sim.extended:
+                cache.put(cache_key, sim.finish())
+
+        except SimulationException as e:
+            result["ok"] = False
+            result["error"] = f"simulate: {e}"
+            return result
+
+        result["ticks"] = sim.current_tick
+        if deterministic:
+            result["state_hash"] = sim.state_hash
+        # A tick replayed from the cache never ran traced, so there is nothing to report for it
+        if debug and sim.current_tick > getattr(sim, "cached_ticks", 0):
+            result["last_tick_allocations"] = sim.allocation_stats
+        result["final"] = [
+            {
+                "name": drawing.name,
+                "position": drawing.simulator_data["position"],
+                "rotation": drawing.simulator_data["rotation"],
+            }
+            for drawing in drawings
+        ]
+
+    return result
+
+
+def find_scenes(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file in sorted(files):
+                    if file.endswith(".json"):
+                        yield os.path.join(root, file)
+        else:
+            yield path
+
+
+def load_baseline(path):
+    """scene_hash → state_hash from an earlier run's output."""
+    expected = {}
+    with open(path) as f:
+        for line in f:
+            result = json.loads(line)
+            if "scene_hash" in result and "state_hash" in result:
+                expected[result["scene_hash"]] = result["state_hash"]
+    return expected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and analyse saved scene files.")
+    parser.add_argument("paths", nargs="+", help="Scene files, or directories to search for *.json scenes")
+    parser.add_argument("--ticks", type=int, default=0, help="Simulation ticks to run per scene (default: 0)")
+    parser.add_argument("--dt", type=float, default=1 / 60, help="Seconds per simulation tick (default: 1/60)")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="Fixed dt (ignores --dt), stable ordering, report scene and state hashes")
+    parser.add_argument("--baseline", help="JSON lines from an earlier --deterministic run to compare state hashes with")
+    parser.add_argument("--cache", help="Trajectory cache directory, replays earlier --deterministic runs")
+    parser.add_argument("--debug", action="store_true", help="Report tracemalloc stats for the last tick")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    expected = load_baseline(args.baseline) if args.baseline else {}
+
+    scenes = list(find_scenes(args.paths))
+    worker = functools.partial(
+        analyse_scene, ticks=args.ticks, delta_time=args.dt, debug=args.debug, deterministic=args.deterministic,
+        cache_dir=args.cache,
+    )
+
+    all_ok = True
+    with multiprocessing.Pool(max(1, args.jobs)) as pool:
+        chunk_size = max(1, len(scenes) // (max(1, args.jobs) * 4))
+        for result in pool.imap_unordered(worker, scenes, chunksize=chunk_size):
+            expected_hash = expected.get(result.get("scene_hash"))
+            state_hash = result.get("state_hash")  # missing if the simulation failed
+            if expected_hash is not None and expected_hash != state_hash:
+                result["ok"] = False
+                result["error"] = f"regression: state hash {state_hash}, expected {expected_hash}" + (
+                    f" ({result['error']})" if "error" in result else ""
+                )
+
+            all_ok &= result["ok"]
+            sys.stdout.write(json.dumps(result) + "\n")
+            sys.stdout.flush()
+
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
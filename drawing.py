@@ -1,4 +1,5 @@
-import pygame
+import json
+from array import array
 
 class Drawing:
     LINE_WIDTH = 3
@@ -11,72 +12,110 @@ class Drawing:
         self.visible = visible
 
 
-        self.pivot_image = pygame.image.load("assets/placables/pivot.png").convert_alpha()
-
         self.pivots = []   # (cx, cy, {...})
         self.anchored = False
         self.lines = []    # ((x1, y1), (x2, y2))
 
+        # Per-segment bounds, packed as (min_x, min_y, max_x, max_y) for each entry in self.lines
+        self.line_bounds = array("d")
+
+        # Running bounding box of every coordinate, None when empty
+        self.__bounds = None
+        self.__bounds_dirty = False
+
         self.simulator_data = {}
 
-    def get_bounds(self):
-        xs, ys = [], []
+    def __extend_bounds(self, min_x, min_y, max_x, max_y):
+        if self.__bounds is None:
+            self.__bounds = (min_x, min_y, max_x, max_y)
+            return
+
+        bx1, by1, bx2, by2 = self.__bounds
+        self.__bounds = (
+            min_x if min_x < bx1 else bx1,
+            min_y if min_y < by1 else by1,
+            max_x if max_x > bx2 else bx2,
+            max_y if max_y > by2 else by2,
+        )
+
+    def __recompute_bounds(self):
+        self.__bounds = None
+        self.__bounds_dirty = False
+
+        line_bounds = self.line_bounds
+        for i, raw in enumerate(self.lines):
+            if raw:
+                self.__extend_bounds(*line_bounds[i * 4:i * 4 + 4])
 
         for raw in self.pivots:
             if raw:
                 cx, cy, *_ = raw
-                xs.append(cx)
-                ys.append(cy)
+                self.__extend_bounds(cx, cy, cx, cy)
 
-        for raw in self.lines:
-            if raw:
-                (x1, y1), (x2, y2) = raw
-                xs.extend([x1, x2])
-                ys.extend([y1, y2])
+    def add_line(self, start, end):
+        """Appends a line, updating the bounds in O(1). Returns the line index."""
+        (x1, y1), (x2, y2) = start, end
+        min_x, max_x = (x1, x2) if x1 < x2 else (x2, x1)
+        min_y, max_y = (y1, y2) if y1 < y2 else (y2, y1)
 
-        if not xs or not ys:
-            return (0, 0), (0, 0)
+        self.lines.append((start, end))
+        self.line_bounds.extend((min_x, min_y, max_x, max_y))
 
-        return (min(xs) - self.LINE_WIDTH, min(ys) - self.LINE_WIDTH), (
-            max(xs) + self.LINE_WIDTH, max(ys) + self.LINE_WIDTH
-        )
+        if not self.__bounds_dirty:
+            self.__extend_bounds(min_x, min_y, max_x, max_y)
 
-    def draw(self, screen, zoom, view_position, is_active):
-        """Draws directly onto the given screen surface."""
-        line_colour = self.ACTIVE_COLOUR if is_active else self.UNACTIVE_COLOUR
+        return len(self.lines) - 1
 
-        for raw in self.lines:
-            if not raw:
-                continue
+    def remove_line(self, index):
+        """Blanks out a line (keeping indices stable for the undo log) and marks the bounds dirty."""
+        self.lines[index] = None
+        self.line_bounds[index * 4:index * 4 + 4] = array("d", (0.0, 0.0, 0.0, 0.0))
+        self.__bounds_dirty = True
 
-            (x1, y1), (x2, y2) = raw
+    def add_pivot(self, px, py, info=None):
+        """Appends a pivot, updating the bounds in O(1). Returns the pivot index."""
+        self.pivots.append([px, py, info])
 
-            # scale + offset into screen space
-            sx1 = x1 * zoom + view_position[0]
-            sy1 = y1 * zoom + view_position[1]
-            sx2 = x2 * zoom + view_position[0]
-            sy2 = y2 * zoom + view_position[1]
+        if not self.__bounds_dirty:
+            self.__extend_bounds(px, py, px, py)
 
-            pygame.draw.line(
-                screen,
-                line_colour,
-                (sx1, sy1), (sx2, sy2),
-                width=round(self.LINE_WIDTH * zoom)
-            )
+        return len(self.pivots) - 1
 
-        for raw in self.pivots:
-            if not raw:
-                continue
+    def remove_pivot(self, index):
+        """Blanks out a pivot (keeping indices stable for the undo log) and marks the bounds dirty."""
+        self.pivots[index] = None
+        self.__bounds_dirty = True
+
+    def get_segment_bounds(self, index):
+        """(min_x, min_y), (max_x, max_y) of a single line, without padding. None for a removed line."""
+        if self.lines[index] is None:
+            return None
+
+        min_x, min_y, max_x, max_y = self.line_bounds[index * 4:index * 4 + 4]
+        return (min_x, min_y), (max_x, max_y)
+
+    def get_bounds(self):
+        if self.__bounds_dirty:
+            self.__recompute_bounds()
 
-            px, py, i = raw
+        if self.__bounds is None:
+            return (0, 0), (0, 0)
+
+        min_x, min_y, max_x, max_y = self.__bounds
+        return (min_x - self.LINE_WIDTH, min_y - self.LINE_WIDTH), (
+            max_x + self.LINE_WIDTH, max_y + self.LINE_WIDTH
+        )
+
+    def draw(self, screen, zoom, view_position, is_active):
+        """Draws directly onto the given screen surface."""
+        from rendering import draw_drawing  # pygame is only imported once something is drawn
+        draw_drawing(screen, self, zoom, view_position, is_active)
 
-            screen_x = px * zoom + view_position[0]
-            screen_y = py * zoom + view_position[1]
 
-            screen.blit(
-                self.pivot_image,
-                (
-                    screen_x - self.pivot_image.get_width() // 2,
-                    screen_y - self.pivot_image.get_height() // 2,
-                )
-            )
+def drawing_content_key(drawing):
+    """Canonical string of everything about a drawing that affects a simulation (name excluded)."""
+    return json.dumps([
+        drawing.anchored,
+        [[float(x1), float(y1), float(x2), float(y2)] for (x1, y1), (x2, y2) in filter(None, drawing.lines)],
+        [[float(px), float(py)] for px, py, _ in filter(None, drawing.pivots)],
+    ])
@@ -0,0 +1,81 @@
+import math
+from collections import defaultdict
+
+
+def is_closed_polygon(lines):
+    adj = defaultdict(set)
+    for (x1, y1), (x2, y2) in lines:
+        adj[(x1, y1)].add((x2, y2))
+        adj[(x2, y2)].add((x1, y1))
+
+    # Every vertex must connect to exactly 2
+    if not all(len(neighbors) == 2 for neighbors in adj.values()):
+        return False, None
+
+    start = next(iter(adj))
+    visited_edges = set()
+    current = start
+    prev = None
+    polygon = [current]
+
+    while True:
+        neighbors = adj[current]
+        next_vertex = [n for n in neighbors if n != prev][0]
+        edge = tuple(sorted([current, next_vertex]))
+
+        if edge in visited_edges:
+            break
+
+        visited_edges.add(edge)
+        polygon.append(next_vertex)
+        prev, current = current, next_vertex
+
+    # Closed if we ended back at start and used all edges (This caused some troubles, forgot to check for all edges)
+    if polygon[0] == polygon[-1] and len(visited_edges) == len(lines):
+        return True, polygon
+    return False, None
+
+def polygon_area(polygon):  # https://www.mathsisfun.com/geometry/area-irregular-polygons.html
+    area = 0
+    for line in polygon:
+        (x1, y1), (x2, y2) = line
+        area += x1 * y2 - x2 * y1
+    return abs(area) / 2
+
+def polygon_mass(polygon, mass_per_area):
+    area = polygon_area(polygon) * 1e-6  # convert mm^2 → m^2
+    return mass_per_area * area if area > 0 else 1.0
+
+def polygon_centroid(polygon):
+    """ Polygon Must Be Closed (First == Last) """
+    A = 0
+    Cx = 0
+    Cy = 0
+    for line in polygon:
+        (x0, y0), (x1, y1) = line
+        cross = x0 * y1 - x1 * y0
+        A += cross
+        Cx += (x0 + x1) * cross
+        Cy += (y0 + y1) * cross
+
+    A = A / 2
+    if A == 0:
+        return None  # Bad stuff, dont want to X / 0
+
+    Cx = Cx / (6 * A)
+    Cy = Cy / (6 * A)
+    return Cx, Cy
+
+
+def transform_point(local_point, body_data):
+    """Transform a local pivot point (x,y) into world space given position+rotation."""
+    lx, ly = local_point
+    px, py = body_data["position"]
+    theta = body_data["rotation"]
+
+    cos_t = math.cos(theta)
+    sin_t = math.sin(theta)
+
+    wx = cos_t * lx - sin_t * ly + px
+    wy = sin_t * lx + cos_t * ly + py
+    return wx, wy
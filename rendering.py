@@ -0,0 +1,96 @@
+"""
+Everything that needs pygame to draw the core objects (Drawing, Simulation).
+
+Only imported lazily from Drawing.draw / Simulation.render, so the core modules
+(geometry, drawing, simulator, scene) stay importable without pygame.
+"""
+import pygame
+
+from drawing import Drawing
+
+PIVOT_IMAGE_PATH = "assets/placables/pivot.png"
+
+_image_cache = {}
+
+
+def load_image(path):
+    """Loads an image once and caches it. Needs a display mode to be set (convert_alpha)."""
+    image = _image_cache.get(path)
+    if image is None:
+        image = _image_cache[path] = pygame.image.load(path).convert_alpha()
+    return image
+
+
+# Reused for every pygame.draw.line call instead of building new coordinate tuples per segment
+_line_start = [0.0, 0.0]
+_line_end = [0.0, 0.0]
+
+
+def draw_drawing(screen, drawing, zoom, view_position, is_active):
+    line_colour = Drawing.ACTIVE_COLOUR if is_active else Drawing.UNACTIVE_COLOUR
+    line_width = round(Drawing.LINE_WIDTH * zoom)
+    vx, vy = view_position
+    start, end = _line_start, _line_end
+
+    for raw in drawing.lines:
+        if not raw:
+            continue
+
+        (x1, y1), (x2, y2) = raw
+
+        # scale + offset into screen space
+        start[0] = x1 * zoom + vx
+        start[1] = y1 * zoom + vy
+        end[0] = x2 * zoom + vx
+        end[1] = y2 * zoom + vy
+
+        pygame.draw.line(screen, line_colour, start, end, width=line_width)
+
+    pivot_image = load_image(PIVOT_IMAGE_PATH)
+    half_w = pivot_image.get_width() // 2
+    half_h = pivot_image.get_height() // 2
+
+    for raw in drawing.pivots:
+        if not raw:
+            continue
+
+        px, py, i = raw
+
+        start[0] = px * zoom + vx - half_w
+        start[1] = py * zoom + vy - half_h
+        screen.blit(pivot_image, start)
+
+
+def draw_simulation(screen, simulation, zoom, view_position):
+    pivot_image = load_image(PIVOT_IMAGE_PATH)
+    half_w = pivot_image.get_width() // 2
+    half_h = pivot_image.get_height() // 2
+
+    line_colour = Drawing.ACTIVE_COLOUR
+    line_width = round(Drawing.LINE_WIDTH * zoom)
+    vx, vy = view_position
+    start, end = _line_start, _line_end
+
+    for drawing in simulation.drawings:
+        data = drawing.simulator_data
+        pos_x, pos_y = data["position"]
+        cos_t, sin_t = data["cos"], data["sin"]  # cached by Simulation.tick
+
+        # draw polygon lines
+        for (x1, y1), (x2, y2) in drawing.lines:
+            # transform into world space, then screen space
+            start[0] = (cos_t * x1 - sin_t * y1 + pos_x) * zoom + vx
+            start[1] = (sin_t * x1 + cos_t * y1 + pos_y) * zoom + vy
+            end[0] = (cos_t * x2 - sin_t * y2 + pos_x) * zoom + vx
+            end[1] = (sin_t * x2 + cos_t * y2 + pos_y) * zoom + vy
+
+            pygame.draw.line(screen, line_colour, start, end, width=line_width)
+
+        # draw pivots
+        for pivot in drawing.pivots:
+            if not pivot:
+                continue
+            px, py, _ = pivot
+            start[0] = (cos_t * px - sin_t * py + pos_x) * zoom + vx - half_w
+            start[1] = (sin_t * px + cos_t * py + pos_y) * zoom + vy - half_h
+            screen.blit(pivot_image, start)
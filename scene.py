@@ -0,0 +1,78 @@
+import hashlib
+import json
+
+from drawing import Drawing, drawing_content_key
+
+SCENE_VERSION = 1
+
+
+def drawing_to_dict(drawing):
+    """Plain JSON-able form of a drawing. Undone (None) lines and pivots are dropped."""
+    return {
+        "name": drawing.name,
+        "visible": drawing.visible,
+        "anchored": drawing.anchored,
+        "lines": [[list(start), list(end)] for start, end in filter(None, drawing.lines)],
+        "pivots": [[px, py, info] for px, py, info in filter(None, drawing.pivots)],
+    }
+
+
+def drawing_from_dict(data):
+    drawing = Drawing(data["name"], visible=data.get("visible", True))
+    drawing.anchored = data.get("anchored", False)
+
+    for start, end in data.get("lines", []):
+        drawing.add_line(tuple(start), tuple(end))
+
+    for px, py, info in data.get("pivots", []):
+        drawing.add_pivot(px, py, info)
+
+    return drawing
+
+
+def scene_hash(drawings, **parameters):
+    """
+    Content hash of a scene plus simulation parameters, e.g. scene_hash(drawings, ticks=600, dt=1/60).
+    Independent of drawing order and names, so it can key cached / expected simulation results.
+    """
+    ordered = sorted(drawings, key=drawing_content_key)
+    order = {id(drawing): i for i, drawing in enumerate(ordered)}
+
+    links = []
+    for i, drawing in enumerate(ordered):
+        for px, py, info in filter(None, drawing.pivots):
+            if isinstance(info, dict) and "connected_to" in info:  # simulator link
+                other, other_pivot = info["connected_to"]
+                links.append([i, float(px), float(py), order.get(id(other)), float(other_pivot[0]), float(other_pivot[1])])
+
+            elif isinstance(info, int) and 0 <= info < len(drawings):  # editor link, by drawing index
+                links.append([i, float(px), float(py), order[id(drawings[info])]])
+
+    content = json.dumps([
+        SCENE_VERSION,
+        [drawing_content_key(drawing) for drawing in ordered],
+        links,
+        sorted(parameters.items()),
+    ])
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def save_scene(path, drawings):
+    with open(path, "w") as f:
+        json.dump({
+            "version": SCENE_VERSION,
+            "drawings": [drawing_to_dict(drawing) for drawing in drawings],
+        }, f)
+
+
+def load_scene(path):
+    with open(path) as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict) or not isinstance(data.get("drawings"), list):
+        raise ValueError("Not a scene file")
+
+    if data.get("version") != SCENE_VERSION:
+        raise ValueError(f"Unsupported scene version: {data.get('version')}")
+
+    return [drawing_from_dict(drawing) for drawing in data["drawings"]]
@@ -1,85 +1,13 @@
+import hashlib
 import math
-from collections import defaultdict
+import struct
+import tracemalloc
 
-import pygame
+from geometry import is_closed_polygon, polygon_mass, polygon_centroid
+from drawing import drawing_content_key
 
-from drawing import Drawing
 
-
-
-def is_closed_polygon(lines):
-    adj = defaultdict(set)
-    for (x1, y1), (x2, y2) in lines:
-        adj[(x1, y1)].add((x2, y2))
-        adj[(x2, y2)].add((x1, y1))
-
-    # Every vertex must connect to exactly 2
-    if not all(len(neighbors) == 2 for neighbors in adj.values()):
-        return False, None
-
-    start = next(iter(adj))
-    visited_edges = set()
-    current = start
-    prev = None
-    polygon = [current]
-
-    while True:
-        neighbors = adj[current]
-        next_vertex = [n for n in neighbors if n != prev][0]
-        edge = tuple(sorted([current, next_vertex]))
-
-        if edge in visited_edges:
-            break
-
-        visited_edges.add(edge)
-        polygon.append(next_vertex)
-        prev, current = current, next_vertex
-
-    # Closed if we ended back at start and used all edges (This caused some troubles, forgot to check for all edges)
-    if polygon[0] == polygon[-1] and len(visited_edges) == len(lines):
-        return True, polygon
-    return False, None
-
-def polygon_area(polygon):  # https://www.mathsisfun.com/geometry/area-irregular-polygons.html
-    area = 0
-    for line in polygon:
-        (x1, y1), (x2, y2) = line
-        area += x1 * y2 - x2 * y1
-    return abs(area) / 2
-
-def polygon_centroid(polygon):
-    """ Polygon Must Be Closed (First == Last) """
-    A = 0
-    Cx = 0
-    Cy = 0
-    for line in polygon:
-        (x0, y0), (x1, y1) = line
-        cross = x0 * y1 - x1 * y0
-        A += cross
-        Cx += (x0 + x1) * cross
-        Cy += (y0 + y1) * cross
-
-    A = A / 2
-    if A == 0:
-        return None  # Bad stuff, dont want to X / 0
-
-    Cx = Cx / (6 * A)
-    Cy = Cy / (6 * A)
-    return Cx, Cy
-
-
-def transform_point(local_point, body_data):
-    """Transform a local pivot point (x,y) into world space given position+rotation."""
-    lx, ly = local_point
-    px, py = body_data["position"]
-    theta = body_data["rotation"]
-
-    cos_t = math.cos(theta)
-    sin_t = math.sin(theta)
-
-    wx = cos_t * lx - sin_t * ly + px
-    wy = sin_t * lx + cos_t * ly + py
-    return wx, wy
+BODY_STATE = struct.Struct("<6d")  # x, y, vx, vy, rotation, rotational_velocity
 
 
 class SimulationException(Exception):
@@ -89,166 +17,247 @@ class Simulation:
     GRAVITY = -9.81  # m/s^2 (downwards)
     MASS_PER_AREA = 0.05  # kg/m^2
 
-    def __init__(self, drawings, gravity=True):
-        self.drawings = drawings
+    FIXED_DELTA_TIME = 1 / 60  # s, used for every tick in deterministic mode
+
+    def __init__(self, drawings, gravity=True, debug=False, deterministic=False, bodies=None):
+        """
+        deterministic: step with FIXED_DELTA_TIME whatever tick() is given, order bodies (and so
+        constraints) by content rather than list order, and keep a rolling hash of the state.
+        Two runs of the same scene then match bit for bit (on the same platform / libm).
+
+        bodies: (mass, center_of_mass) per drawing from an earlier get_bodies() of the same scene,
+        skips the polygon checks and mass calculations (see trajectory_cache.py).
+        """
+        self.deterministic = deterministic
+        self.drawings = sorted(drawings, key=drawing_content_key) if deterministic else drawings
         self.current_tick = 0
         self.use_gravity = gravity
 
-        self.pivot_image = pygame.image.load("assets/placables/pivot.png").convert_alpha()
+        # Rolling hash of (position, velocity, rotation) of every body, updated each deterministic tick
+        self.state_digest = b""
+        self.__state_buffer = bytearray(BODY_STATE.size * len(self.drawings))
 
-        self.__prepare_drawings()
+        # With debug on, every tick is traced with tracemalloc and the result kept here
+        self.debug = debug
+        self.allocation_stats = {"net_bytes": 0, "peak_bytes": 0}
+
+        self.__constraints = []  # (d1, px, py, d2, ox, oy), built once so tick() doesn't walk every pivot
+
+        self.__prepare_drawings(bodies)
 
     def __calculate_mass(self, drawing):
-        area = polygon_area(drawing.lines) * 1e-6  # convert mm^2 → m^2
-        return self.MASS_PER_AREA * area if area > 0 else 1.0
+        return polygon_mass(drawing.lines, self.MASS_PER_AREA)
 
     def __calculate_center_of_mass(self, drawing):
         return polygon_centroid(drawing.lines)
 
 
-    def __prepare_drawings(self):
-        for drawing in self.drawings:
-            closed, polygon = is_closed_polygon(drawing.lines)
+    def __prepare_drawings(self, bodies=None):
+        for i, drawing in enumerate(self.drawings):
+            if bodies is None:
+                closed, polygon = is_closed_polygon(drawing.lines)
 
-            if not closed:
-                raise SimulationException("Polygon is not enclosed or is multiple objects")
+                if not closed:
+                    raise SimulationException("Polygon is not enclosed or is multiple objects")
 
+                mass = self.__calculate_mass(drawing)
+                center_of_mass = self.__calculate_center_of_mass(drawing)
+            else:
+                mass, center_of_mass = bodies[i]
+
+            # Mutable containers are updated in place by tick(), never replaced
             drawing.simulator_data = {
                 "tick": -1,
-                "mass": self.__calculate_mass(drawing),
-                "center_of_mass": self.__calculate_center_of_mass(drawing),
+                "mass": mass,
+                "center_of_mass": center_of_mass,
 
                 "rotation": 0.0,
                 "rotational_velocity": 0.0,
+                "cos": 1.0,  # cos / sin of rotation, cached once per tick
+                "sin": 0.0,
 
-                "position": (0.0, 0.0),
+                "position": [0.0, 0.0],
                 "vertical_velocity": 0.0,
                 "horizontal_velocity": 0.0,
 
-                "forces": []
+                "forces": [0.0, 0.0]  # accumulated (fx, fy) for the next tick, see apply_force
             }
 
+        # Follows body order, so constraints are applied in a stable order in deterministic mode too
+        for d1 in self.drawings:
+            for pivot in d1.pivots:
+                if not pivot:
+                    continue
+
+                px, py, info = pivot
+                if not isinstance(info, dict):
+                    continue
+
+                if "connected_to" not in info:
+                    continue
+
+                d2, other_pivot = info["connected_to"]
+                self.__constraints.append((d1, px, py, d2, other_pivot[0], other_pivot[1]))
+
+    @staticmethod
+    def apply_force(drawing, fx, fy):
+        """Adds a force (N) to a drawing for the next tick only."""
+        forces = drawing.simulator_data["forces"]
+        forces[0] += fx
+        forces[1] += fy
+
+    def get_bodies(self):
+        """(mass, center_of_mass) per drawing, in simulation order."""
+        return [
+            (drawing.simulator_data["mass"], drawing.simulator_data["center_of_mass"])
+            for drawing in self.drawings
+        ]
+
+    def get_state(self):
+        """Everything needed to resume stepping: (x, y, vx, vy, rotation, rotational_velocity) per drawing."""
+        state = []
+        for drawing in self.drawings:
+            data = drawing.simulator_data
+            position = data["position"]
+            state.append((position[0], position[1], data["horizontal_velocity"], data["vertical_velocity"],
+                          data["rotation"], data["rotational_velocity"]))
+        return state
+
+    def set_state(self, state, tick, state_digest=b""):
+        for drawing, (x, y, vx, vy, rotation, rotational_velocity) in zip(self.drawings, state):
+            data = drawing.simulator_data
+            data["position"][0] = x
+            data["position"][1] = y
+            data["horizontal_velocity"] = vx
+            data["vertical_velocity"] = vy
+            data["rotation"] = rotation
+            data["rotational_velocity"] = rotational_velocity
+            data["cos"] = math.cos(rotation)
+            data["sin"] = math.sin(rotation)
+
+        self.current_tick = tick
+        self.state_digest = state_digest
+
+    @property
+    def state_hash(self):
+        return self.state_digest.hex()
+
     def tick(self, delta_time):
-        """Advance simulation by delta_time seconds."""
-        # 1. Apply forces (gravity, user-defined)
+        """Advance simulation by delta_time seconds (FIXED_DELTA_TIME in deterministic mode)."""
+        if self.deterministic:
+            delta_time = self.FIXED_DELTA_TIME
+
+        if self.debug:
+            self.__traced_tick(delta_time)
+        else:
+            self.__tick(delta_time)
+
+    def __update_state_hash(self):
+        buffer = self.__state_buffer
+        offset = 0
         for drawing in self.drawings:
             data = drawing.simulator_data
-            if self.use_gravity and not drawing.anchored:
-                data["forces"].append((0.0, data["mass"] * self.GRAVITY))
+            position = data["position"]
+            BODY_STATE.pack_into(buffer, offset, position[0], position[1], data["horizontal_velocity"],
+                                 data["vertical_velocity"], data["rotation"], data["rotational_velocity"])
+            offset += BODY_STATE.size
+
+        hasher = hashlib.blake2b(self.state_digest, digest_size=16)
+        hasher.update(self.__state_buffer)
+        self.state_digest = hasher.digest()
+
+    def __traced_tick(self, delta_time):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+
+        self.__tick(delta_time)
+
+        after, peak = tracemalloc.get_traced_memory()
+        self.allocation_stats["net_bytes"] = after - before
+        self.allocation_stats["peak_bytes"] = peak - before
 
-        # 2. Integrate motion
+        if started:
+            tracemalloc.stop()
+
+    def __tick(self, delta_time):
+        gravity = self.GRAVITY if self.use_gravity else 0.0
+
+        # 1. Apply forces (gravity + apply_force) and integrate motion
         for drawing in self.drawings:
             data = drawing.simulator_data
+            position = data["position"]
+            forces = data["forces"]
 
             if drawing.anchored:
                 # Keep locked in place
-                data["position"] = (0.0, 0.0)
+                position[0] = 0.0
+                position[1] = 0.0
                 data["horizontal_velocity"] = 0.0
                 data["vertical_velocity"] = 0.0
                 data["rotation"] = 0.0
                 data["rotational_velocity"] = 0.0
-                data["forces"] = []
+                data["cos"] = 1.0
+                data["sin"] = 0.0
+                forces[0] = 0.0
+                forces[1] = 0.0
                 continue
 
-            # Sum forces
-            fx = sum(f[0] for f in data["forces"])
-            fy = sum(f[1] for f in data["forces"])
-
-            ax = fx / data["mass"]
-            ay = fy / data["mass"]
+            mass = data["mass"]
+            ax = forces[0] / mass
+            ay = (forces[1] + mass * gravity) / mass
 
             # Linear motion
             data["horizontal_velocity"] += ax * delta_time
             data["vertical_velocity"] += ay * delta_time
 
-            px, py = data["position"]
-            px += data["horizontal_velocity"] * delta_time
-            py += data["vertical_velocity"] * delta_time
-            data["position"] = (px, py)
+            position[0] += data["horizontal_velocity"] * delta_time
+            position[1] += data["vertical_velocity"] * delta_time
 
             # Angular motion (TODO: apply torques if needed)
-            data["rotation"] += data["rotational_velocity"] * delta_time
+            rotation = data["rotation"] + data["rotational_velocity"] * delta_time
+            data["rotation"] = rotation
+            data["cos"] = math.cos(rotation)
+            data["sin"] = math.sin(rotation)
 
             # Reset forces
-            data["forces"] = []
-
-        # 3. Enforce pivot constraints
-        for d1 in self.drawings:
-            for pivot in d1.pivots:
-                if not pivot:
-                    continue
-
-                px, py, info = pivot
-                if not isinstance(info, dict):
-                    continue
-
-                if "connected_to" not in info:
-                    continue
-
-                d2, other_pivot = info["connected_to"]
-
-                # world positions of pivot points
-                w1 = transform_point((px, py), d1.simulator_data)
-                w2 = transform_point(other_pivot[:2], d2.simulator_data)
-
-                dx, dy = (w2[0] - w1[0], w2[1] - w1[1])
-                dist = math.hypot(dx, dy)
-
-                if dist > 1e-6:  # tolerance
-                    correction = (dx / 2.0, dy / 2.0)
-                    if not d1.anchored:
-                        p1x, p1y = d1.simulator_data["position"]
-                        d1.simulator_data["position"] = (p1x + correction[0], p1y + correction[1])
-
-                    if not d2.anchored:
-                        p2x, p2y = d2.simulator_data["position"]
-                        d2.simulator_data["position"] = (p2x - correction[0], p2y - correction[1])
+            forces[0] = 0.0
+            forces[1] = 0.0
+
+        # 2. Enforce pivot constraints
+        for d1, px, py, d2, ox, oy in self.__constraints:
+            data1 = d1.simulator_data
+            data2 = d2.simulator_data
+            p1 = data1["position"]
+            p2 = data2["position"]
+
+            # world positions of pivot points
+            cos_1, sin_1 = data1["cos"], data1["sin"]
+            cos_2, sin_2 = data2["cos"], data2["sin"]
+            dx = (cos_2 * ox - sin_2 * oy + p2[0]) - (cos_1 * px - sin_1 * py + p1[0])
+            dy = (sin_2 * ox + cos_2 * oy + p2[1]) - (sin_1 * px + cos_1 * py + p1[1])
+
+            if math.hypot(dx, dy) > 1e-6:  # tolerance
+                dx /= 2.0
+                dy /= 2.0
+                if not d1.anchored:
+                    p1[0] += dx
+                    p1[1] += dy
+
+                if not d2.anchored:
+                    p2[0] -= dx
+                    p2[1] -= dy
+
+        # Inside __tick so the debug allocation counter includes hashing
+        if self.deterministic:
+            self.__update_state_hash()
 
         self.current_tick += 1
 
     def render(self, screen, zoom, view_position):
         """Render all drawings with their simulated transforms applied."""
-        for drawing in self.drawings:
-            data = drawing.simulator_data
-            pos = data["position"]
-            rot = data["rotation"]
-
-            # draw polygon lines
-            line_colour = Drawing.ACTIVE_COLOUR
-            cos_t, sin_t = math.cos(rot), math.sin(rot)
-            for (x1, y1), (x2, y2) in drawing.lines:
-                # transform into world space
-                wx1 = cos_t * x1 - sin_t * y1 + pos[0]
-                wy1 = sin_t * x1 + cos_t * y1 + pos[1]
-                wx2 = cos_t * x2 - sin_t * y2 + pos[0]
-                wy2 = sin_t * x2 + cos_t * y2 + pos[1]
-
-                sx1 = wx1 * zoom + view_position[0]
-                sy1 = wy1 * zoom + view_position[1]
-                sx2 = wx2 * zoom + view_position[0]
-                sy2 = wy2 * zoom + view_position[1]
-
-                pygame.draw.line(
-                    screen,
-                    line_colour,
-                    (sx1, sy1), (sx2, sy2),
-                    width=round(Drawing.LINE_WIDTH * zoom)
-                )
-
-            # draw pivots
-            for pivot in drawing.pivots:
-                if not pivot:
-                    continue
-                px, py, _ = pivot
-                wx, wy = transform_point((px, py), data)
-                screen_x = wx * zoom + view_position[0]
-                screen_y = wy * zoom + view_position[1]
-                screen.blit(
-                    self.pivot_image,
-                    (
-                        screen_x - self.pivot_image.get_width() // 2,
-                        screen_y - self.pivot_image.get_height() // 2,
-                    )
-                )
-
-
+        from rendering import draw_simulation  # pygame is only imported once something is drawn
+        draw_simulation(screen, self, zoom, view_position)
@@ -0,0 +1,84 @@
+import math
+
+
+def snap_to_grid(x, y, spacing):
+    """Rounds a drawing-space point to the nearest grid intersection."""
+    return round(x / spacing) * spacing, round(y / spacing) * spacing
+
+
+class SnapIndex:
+    """
+    Spatial hash of every snappable feature (line endpoints and pivots) across all drawings.
+
+    Points are bucketed into square cells of cell_size, so a nearest() query only looks at the
+    few cells overlapping its radius instead of every point. Kept up to date incrementally
+    through add_point / remove_point as the scene is edited.
+    """
+
+    def __init__(self, cell_size=20):
+        self.cell_size = cell_size
+        self.__cells = {}  # (cell_x, cell_y) -> {(x, y): number of features at that exact point}
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def __cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def add_point(self, x, y):
+        cell = self.__cells.setdefault(self.__cell(x, y), {})
+        cell[(x, y)] = cell.get((x, y), 0) + 1
+        self.__count += 1
+
+    def remove_point(self, x, y):
+        key = self.__cell(x, y)
+        cell = self.__cells.get(key)
+        if cell is None or (x, y) not in cell:
+            return
+
+        cell[(x, y)] -= 1
+        if cell[(x, y)] == 0:
+            del cell[(x, y)]
+            if not cell:
+                del self.__cells[key]
+        self.__count -= 1
+
+    def add_line(self, line):
+        start, end = line
+        self.add_point(*start)
+        self.add_point(*end)
+
+    def remove_line(self, line):
+        start, end = line
+        self.remove_point(*start)
+        self.remove_point(*end)
+
+    def remove_drawing(self, drawing):
+        for line in drawing.lines:
+            if line:
+                self.remove_line(line)
+
+        for pivot in drawing.pivots:
+            if pivot:
+                self.remove_point(pivot[0], pivot[1])
+
+    def nearest(self, x, y, radius):
+        """Closest feature within radius of (x, y), or None."""
+        cell_x, cell_y = self.__cell(x, y)
+        reach = math.ceil(radius / self.cell_size)
+
+        best = None
+        best_dist = radius * radius
+        for cx in range(cell_x - reach, cell_x + reach + 1):
+            for cy in range(cell_y - reach, cell_y + reach + 1):
+                cell = self.__cells.get((cx, cy))
+                if not cell:
+                    continue
+
+                for point in cell:
+                    dist = (point[0] - x) ** 2 + (point[1] - y) ** 2
+                    if dist <= best_dist:
+                        best, best_dist = point, dist
+
+        return best
@@ -0,0 +1,251 @@
+"""
+On-disk cache of simulated trajectories, keyed by scene content.
+
+Only deterministic simulations are cached, so playing a trajectory back is indistinguishable
+from stepping it live. Each entry is one file named after its key:
+
+    <json header>\\n<frames: float64 x, y, rotation per body per tick><digests: 16 bytes per tick>
+"""
+import json
+import math
+import os
+from array import array
+
+from scene import scene_hash
+from simulator import Simulation
+
+CACHE_VERSION = 1
+FRAME_SIZE = 3  # x, y, rotation
+DIGEST_SIZE = 16
+
+
+class Trajectory:
+    def __init__(self, bodies, frames=None, digests=b"", final_state=None):
+        self.bodies = bodies  # Simulation.get_bodies()
+        self.frames = frames if frames is not None else array("d")
+        self.digests = bytearray(digests)  # state_digest after every tick
+        self.final_state = final_state  # Simulation.get_state() after the last tick
+
+    @property
+    def ticks(self):
+        return len(self.digests) // DIGEST_SIZE
+
+    def to_bytes(self):
+        header = json.dumps({
+            "version": CACHE_VERSION,
+            "bodies": self.bodies,
+            "ticks": self.ticks,
+            "final_state": self.final_state,
+        }).encode()
+        return header + b"\n" + self.frames.tobytes() + bytes(self.digests)
+
+    @classmethod
+    def from_bytes(cls, data):
+        header_end = data.index(b"\n")
+        header = json.loads(data[:header_end])
+        if header["version"] != CACHE_VERSION:
+            raise ValueError(f"Unsupported trajectory cache version: {header['version']}")
+
+        frames = array("d")
+        frames_end = header_end + 1 + header["ticks"] * len(header["bodies"]) * FRAME_SIZE * frames.itemsize
+        frames.frombytes(data[header_end + 1:frames_end])
+
+        digests = data[frames_end:]
+        if len(digests) != header["ticks"] * DIGEST_SIZE or (header["ticks"] and not header["final_state"]):
+            raise ValueError("Truncated trajectory cache entry")
+
+        bodies = [(mass, tuple(com) if com else com) for mass, com in header["bodies"]]
+        final_state = [tuple(body) for body in header["final_state"]] if header["final_state"] else None
+        return cls(bodies, frames, digests, final_state)
+
+
+class TrajectoryCache:
+    """
+    Directory of trajectories, kept under max_bytes by evicting the least recently used.
+
+    The directory is only scanned once, on the first put, after which a running total is kept.
+    Eviction (a full scan) only happens once that total goes over max_bytes, and then frees space
+    down to LOW_WATER of it so the next few puts don't scan again. With several processes sharing a
+    directory each only sees its own writes between scans, so the directory can briefly run over
+    max_bytes by what the others wrote; the next eviction scan puts it right.
+    """
+    LOW_WATER = 0.8  # fraction of max_bytes that eviction frees space down to
+    MAX_ENTRY_FRACTION = 0.25  # largest single entry, as a fraction of max_bytes
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = int(max_bytes * self.MAX_ENTRY_FRACTION)
+        self.__total_bytes = None  # running size of the directory, None until the first put
+
+    @staticmethod
+    def key(drawings, gravity=True):
+        return scene_hash(
+            drawings,
+            cache_version=CACHE_VERSION,
+            gravity=gravity,
+            gravity_constant=Simulation.GRAVITY,
+            mass_per_area=Simulation.MASS_PER_AREA,
+            dt=Simulation.FIXED_DELTA_TIME,
+        )
+
+    def max_ticks(self, body_count):
+        """Longest trajectory of body_count bodies that still fits in one entry (for max_recorded_ticks)."""
+        header_bytes = 256 + body_count * 256  # generous allowance for the JSON header
+        tick_bytes = body_count * FRAME_SIZE * array("d").itemsize + DIGEST_SIZE
+        return max(0, (self.max_entry_bytes - header_bytes) // tick_bytes)
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + ".traj")
+
+    def get(self, key):
+        path = self.__path(key)
+        try:
+            with open(path, "rb") as f:
+                trajectory = Trajectory.from_bytes(f.read())
+        except (OSError, ValueError, KeyError):
+            return None
+
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock
+        except FileNotFoundError:
+            pass  # evicted by another worker since the read, the data we have is still good
+        return trajectory
+
+    def put(self, key, trajectory):
+        """
+        Returns False if the entry couldn't be written, which only costs a cache miss next time.
+        Entries over max_entry_bytes are refused, rather than evicting the rest of the cache for them.
+        """
+        data = trajectory.to_bytes()
+        if len(data) > self.max_entry_bytes:
+            return False
+
+        path = self.__path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"  # workers may write the same key at once
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.__total_bytes is None:
+                self.__total_bytes = sum(size for _, size, _ in self.__scan())
+
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+            self.__total_bytes += len(data) - replaced
+            if self.__total_bytes > self.max_bytes:
+                self.__evict()
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+        return True
+
+    def __scan(self):
+        """(mtime, size, path) of every entry."""
+        # Other workers may evict the same entries concurrently, so any file can vanish under us
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".traj"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def __evict(self):
+        entries = self.__scan()
+        total = sum(size for _, size, _ in entries)
+
+        if total > self.max_bytes:
+            low_water = self.max_bytes * self.LOW_WATER
+            for _, size, path in sorted(entries):
+                if total <= low_water:
+                    break
+
+                total -= size
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        self.__total_bytes = total
+
+
+class CachedSimulation(Simulation):
+    """
+    Deterministic Simulation that plays back a cached trajectory up to its horizon, then carries
+    on stepping live from the cached final state. Live ticks are recorded onto the trajectory,
+    so it can be written back with a longer horizon (see extended), up to max_recorded_ticks;
+    past that it keeps stepping live without recording, so memory stays bounded.
+    """
+
+    def __init__(self, drawings, trajectory=None, gravity=True, debug=False, max_recorded_ticks=None):
+        super().__init__(
+            drawings, gravity=gravity, debug=debug, deterministic=True,
+            bodies=trajectory.bodies if trajectory else None,
+        )
+
+        self.trajectory = trajectory or Trajectory(self.get_bodies())
+        self.cached_ticks = self.trajectory.ticks
+        self.max_recorded_ticks = max_recorded_ticks
+
+    @property
+    def extended(self):
+        """True once live stepping has gone past the horizon the trajectory was loaded with."""
+        return self.trajectory.ticks > self.cached_ticks
+
+    def tick(self, delta_time):
+        trajectory = self.trajectory
+        tick = self.current_tick
+
+        if tick < self.cached_ticks:
+            frames = trajectory.frames
+            offset = tick * len(self.drawings) * FRAME_SIZE
+            for drawing in self.drawings:
+                data = drawing.simulator_data
+                rotation = frames[offset + 2]
+                data["position"][0] = frames[offset]
+                data["position"][1] = frames[offset + 1]
+                data["rotation"] = rotation
+                data["cos"] = math.cos(rotation)
+                data["sin"] = math.sin(rotation)
+                offset += FRAME_SIZE
+
+            self.current_tick += 1
+            self.state_digest = bytes(trajectory.digests[tick * DIGEST_SIZE:(tick + 1) * DIGEST_SIZE])
+
+            if self.current_tick == self.cached_ticks:
+                # Velocities aren't part of the frames, restore them before stepping live
+                self.set_state(trajectory.final_state, self.current_tick, self.state_digest)
+            return
+
+        super().tick(delta_time)
+
+        if self.max_recorded_ticks is not None and trajectory.ticks >= self.max_recorded_ticks:
+            return  # recording is full, keep stepping live only
+
+        for drawing in self.drawings:
+            data = drawing.simulator_data
+            trajectory.frames.extend((data["position"][0], data["position"][1], data["rotation"]))
+        trajectory.digests += self.state_digest
+
+        if trajectory.ticks == self.max_recorded_ticks:
+            trajectory.final_state = self.get_state()  # the state the recording ends on, not the live one
+
+    def finish(self):
+        """Trajectory including the final state (taken once, not every tick), ready for TrajectoryCache.put."""
+        if self.current_tick == self.trajectory.ticks:
+            self.trajectory.final_state = self.get_state()
+        return self.trajectory